@@ -0,0 +1,101 @@
+"""Small file-backed TTL cache for SL API responses, shared by the CLI tools.
+
+validate_config.py and find_station_info.py tend to be re-run back to back
+while editing config.json; departures only change on the order of seconds to
+minutes and station search results almost never do, so a fresh entry here
+saves a full API round-trip. Payloads must be JSON-serializable. The compact
+departure records both tools cache are defined at the bottom of this module.
+
+Best-effort throughout: an unreadable or unwritable cache file just means
+every lookup is a miss.
+"""
+import json
+import os
+import threading
+import time
+
+_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.api_cache.json')
+
+# Entries older than this are dropped on the next write, whatever TTL callers
+# read them with, so the file can't grow without bound.
+_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# Both CLI tools request this departures window and share the cached records
+DEPARTURES_FORECAST = 60
+
+_lock = threading.Lock()
+_entries = None  # loaded lazily from _CACHE_FILE: key -> {'t': epoch seconds, 'data': payload}
+
+
+def _load() -> dict:
+    global _entries
+    if _entries is None:
+        try:
+            with open(_CACHE_FILE, 'r', encoding='utf-8') as f:
+                _entries = json.load(f)
+        except Exception:
+            _entries = {}
+    return _entries
+
+
+def get(key: str, ttl: float):
+    """Return the payload cached under `key` if it is younger than `ttl` seconds, else None."""
+    if ttl <= 0:
+        return None
+    with _lock:
+        entry = _load().get(key)
+    if entry and time.time() - entry['t'] < ttl:
+        return entry['data']
+    return None
+
+
+def put(key: str, data, ttl: float) -> None:
+    """Store `data` under `key` and persist the cache file. Never raises.
+
+    `ttl` is the one the entry will be read back with; at 0 or below caching
+    is disabled, so nothing is stored and the file isn't rewritten.
+    """
+    if ttl <= 0:
+        return
+    now = time.time()
+    with _lock:
+        entries = _load()
+        entries[key] = {'t': now, 'data': data}
+        for stale in [k for k, e in entries.items() if now - e['t'] > _MAX_AGE_SECONDS]:
+            del entries[stale]
+        tmp_path = _CACHE_FILE + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, _CACHE_FILE)
+        except Exception:
+            pass
+
+
+def departures_key(site_id) -> str:
+    """Cache key for a site's departure_records()."""
+    return f"departure_records:{site_id}:{DEPARTURES_FORECAST}"
+
+
+def _extract_line(dep):
+    """Line designation of a departure as a string, or None if it has none."""
+    line_info = dep.get('line')
+    if isinstance(line_info, dict):
+        line_num = line_info.get('designation')
+    else:
+        line_num = dep.get('line_designation')
+    return str(line_num) if line_num is not None else None
+
+
+def departure_records(data) -> list:
+    """Flatten a departures payload to (line, destination, stop name) tuples.
+
+    These three fields are all the CLI tools read, so the rest of the (often
+    large) payload is dropped straight after parsing instead of being cached.
+    Defined here rather than in each tool so the cached format can't drift
+    between them.
+    """
+    return [
+        (_extract_line(dep), dep.get('destination'), (dep.get('stop_area') or {}).get('name'))
+        for dep in data.get('departures', [])
+    ]
@@ -1,13 +1,19 @@
 from flask import Flask, render_template, jsonify, request
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
-import requests
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import ciso8601
 import json
+import orjson
 import os
+import sys
 import logging
+import time
+import heapq
 from dataclasses import dataclass
 from typing import Optional, List
 from collections import defaultdict
+from operator import itemgetter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Must run before importing trafiklab_client — it reads its API keys from the
@@ -16,10 +22,27 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # where the host injects real env vars before the process even starts).
 load_dotenv()
 
-from http_utils import fetch_with_retry
+from http_utils import SESSION, fetch_with_retry
 import trafiklab_client
 
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify() and request.get_json() through orjson instead of stdlib json."""
+
+    _options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self._options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self._options), mimetype='application/json')
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,10 +62,18 @@ class SiteResult:
 
 # ── Config cache ────────────────────────────────────────────────────────────────
 
-_config_cache = {'data': {}, 'grouped': {}, 'mtime': 0}
+_config_cache = {'data': {}, 'grouped': {}, 'site_filters': {}, 'mtime': 0, 'last_check': float('-inf')}
+
+# How often (seconds) get_config stats config.json for changes; calls in between
+# reuse the cached config without touching the filesystem.
+CONFIG_CHECK_INTERVAL = 5
 
 def get_config():
     """Load configuration, reloading if file changed."""
+    now = time.monotonic()
+    if now - _config_cache['last_check'] < CONFIG_CHECK_INTERVAL:
+        return _config_cache['data'], _config_cache['grouped']
+
     config_path = os.path.join(os.path.dirname(__file__), 'config.json')
     try:
         current_mtime = os.path.getmtime(config_path)
@@ -60,13 +91,28 @@ def get_config():
                 if site_id not in grouped[group]:
                     grouped[group][site_id] = {'label': route.get('label'), 'filters': []}
                 grouped[group][site_id]['filters'].append(
-                    RouteFilter(line=str(route['line']), dest=route['dest'].lower())
+                    RouteFilter(line=sys.intern(str(route['line'])), dest=route['dest'].lower())
                 )
+            # Per-site filters merged across groups, so a station that appears
+            # in several groups is fetched once with everything it needs
+            site_filters = defaultdict(list)
+            for sites in grouped.values():
+                for site_id, site_config in sites.items():
+                    site_config['filters_by_line'] = build_filter_index(site_config['filters'])
+                    site_filters[site_id].extend(site_config['filters'])
 
             _config_cache['data'] = config
             _config_cache['grouped'] = grouped
+            _config_cache['site_filters'] = {
+                site_id: build_filter_index(filters) for site_id, filters in site_filters.items()
+            }
             _config_cache['mtime'] = current_mtime
+            # Cached site results were filtered with the old routes
+            _site_cache.clear()
 
+        # Only start skipping stats once a load has actually succeeded; a thread
+        # arriving mid-load must not be handed the still-empty initial config
+        _config_cache['last_check'] = now
         return _config_cache['data'], _config_cache['grouped']
     except Exception as e:
         logger.error(f"Error loading config: {e}")
@@ -74,7 +120,16 @@ def get_config():
 
 # ── Data caches ────────────────────────────────────────────────────────────────
 
-_cache = {'data': None, 'timestamp': None}
+# Per-site results, so one stale site doesn't force a refetch of every other site.
+# This is the only response cache: the group pass over cached sites is cheap, so
+# /api/data rebuilds its payload every request rather than layering a second
+# cache with the same TTL on top.
+_site_cache: dict = {}  # site_id -> (monotonic timestamp, SiteResult)
+
+# Shared pool for fanning out per-site SL API calls. The work is almost entirely
+# waiting on the network, so threads overlap the round-trips nicely.
+FETCH_WORKERS = 16
+EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='sl-fetch')
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
@@ -83,52 +138,96 @@ def parse_datetime(iso_string):
     if not iso_string:
         return None
     try:
-        return datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
-    except (ValueError, AttributeError) as e:
+        # ciso8601 accepts the trailing 'Z' as-is, no .replace() needed
+        return ciso8601.parse_datetime(iso_string)
+    except (ValueError, TypeError) as e:
         logger.warning(f"Failed to parse datetime '{iso_string}': {e}")
         return None
 
+def _is_iso_clock(s):
+    return len(s) >= 19 and s[10] == 'T' and s[13] == ':' and s[16] == ':'
+
+def iso_seconds_delta(start_str, end_str):
+    """Seconds from start_str to end_str (ISO 8601), or None if either is unparseable.
+
+    SL sends both timestamps of a departure in the same 'YYYY-MM-DDTHH:MM:SS'
+    shape, so when the formats line up the delta is read straight off the
+    digits; the date only matters on the rare midnight rollover. Anything
+    else goes through parse_datetime.
+    """
+    if not start_str or not end_str:
+        return None
+    if _is_iso_clock(start_str) and _is_iso_clock(end_str) and start_str[19:] == end_str[19:]:
+        try:
+            delta = ((int(end_str[11:13]) - int(start_str[11:13])) * 3600
+                     + (int(end_str[14:16]) - int(start_str[14:16])) * 60
+                     + int(end_str[17:19]) - int(start_str[17:19]))
+            if start_str[:10] != end_str[:10]:
+                delta += (date.fromisoformat(end_str[:10]) - date.fromisoformat(start_str[:10])).days * 86400
+            return delta
+        except ValueError:
+            pass
+    start_dt = parse_datetime(start_str)
+    end_dt = parse_datetime(end_str)
+    if not start_dt or not end_dt:
+        return None
+    return (end_dt - start_dt).total_seconds()
+
 def calculate_delay_status(scheduled_str, expected_str):
     """Calculate delay status based on scheduled vs expected time."""
-    s_dt = parse_datetime(scheduled_str)
-    e_dt = parse_datetime(expected_str or scheduled_str)
-    if not s_dt or not e_dt:
-        return None, None
-    delta_minutes = (e_dt - s_dt).total_seconds() / 60
+    delta_seconds = iso_seconds_delta(scheduled_str, expected_str or scheduled_str)
+    if delta_seconds is None:
+        return None
+    delta_minutes = delta_seconds / 60
     if delta_minutes > 1:
         status = f"+{int(delta_minutes)} min"
     elif delta_minutes < -1:
         status = f"{int(delta_minutes)} min"
     else:
         status = "On Time"
-    return status, e_dt
+    return status
 
-def matches_filter(line_num, destination, filters):
-    """Check if departure matches any of the given filters."""
-    line_str = str(line_num) if line_num is not None else ''
-    dest_lower = (destination or '').lower()
+def build_filter_index(filters):
+    """Index RouteFilters by line: {line: (dest_substring, ...)}."""
+    index = defaultdict(list)
     for f in filters:
-        if isinstance(f, RouteFilter):
-            f_line, f_dest = f.line, f.dest
-        else:
-            f_line, f_dest = f['line'], f['dest']
-        if line_str == f_line and f_dest in dest_lower:
-            return True
-    return False
-
-def enrich_departure(departure, line_num, filters):
+        index[f.line].append(f.dest)
+    return {line: tuple(dests) for line, dests in index.items()}
+
+def matches_filter(line_str, dest_lower, filters_index):
+    """Check if a departure matches any filter in a build_filter_index() index.
+
+    Takes the line already stringified and the destination already lowercased,
+    so callers normalize each departure once rather than once per filter.
+    """
+    dests = filters_index.get(line_str)
+    if not dests:
+        return False
+    return any(sub in dest_lower for sub in dests)
+
+def _line_sort_key(line):
+    """Natural-ish ordering for line designations: '4' < '17' < '172'."""
+    return len(line), line
+
+def enrich_departure(departure, line_num, line_str, dest_lower):
     """Add display information to a departure."""
     sched_str = departure.get('scheduled')
     exp_str = departure.get('expected') or sched_str
-    status, e_dt = calculate_delay_status(sched_str, exp_str)
-    if not status or not e_dt:
+    status = calculate_delay_status(sched_str, exp_str)
+    if not status:
         return None
     return {
         **departure,
-        'display_time': e_dt.strftime("%H:%M"),
-        'expected_iso': e_dt.isoformat(),
+        # HH:MM sits at a fixed offset in ISO 8601, no strftime needed
+        'display_time': exp_str[11:16],
+        'expected_iso': exp_str,
         'status_text': status,
-        'line_num': line_num
+        'line_num': line_num,
+        # Normalized match keys, so the per-group re-filter in /api/data
+        # doesn't redo str()/lower() for every departure
+        '_line_str': line_str,
+        '_dest_lower': dest_lower,
+        '_sort_key': exp_str,
     }
 
 def _add_gtfs_cross_check(dep: dict, site_id, config: dict, station_deviations: Optional[list] = None, station_name: Optional[str] = None) -> None:
@@ -148,10 +247,9 @@ def _add_gtfs_cross_check(dep: dict, site_id, config: dict, station_deviations:
         if match:
             dep['trip_id'] = match.get('trip_id')
             if match.get('delay_seconds') is not None:
-                sched_dt = parse_datetime(scheduled)
-                exp_dt = parse_datetime(dep.get('expected') or scheduled)
-                if sched_dt and exp_dt:
-                    sl_delay_minutes = (exp_dt - sched_dt).total_seconds() / 60
+                sl_delay_seconds = iso_seconds_delta(scheduled, dep.get('expected') or scheduled)
+                if sl_delay_seconds is not None:
+                    sl_delay_minutes = sl_delay_seconds / 60
                     gtfs_delay_minutes = match['delay_seconds'] / 60
                     dep['gtfs_cross_check'] = 'match' if abs(sl_delay_minutes - gtfs_delay_minutes) <= 1 else 'delay_diff'
 
@@ -174,25 +272,29 @@ def _add_gtfs_cross_check(dep: dict, site_id, config: dict, station_deviations:
         logger.warning(f"GTFS cross-check failed for site {site_id} line {dep.get('line_num')}: {e}")
 
 
-def get_departures(site_id: int, filters: list) -> SiteResult:
-    """Fetch and filter departures for a site, with retry and coordinate caching."""
+def get_departures(site_id: int, filters_index: dict) -> SiteResult:
+    """Fetch and filter departures for a site, with retry and per-site TTL caching."""
     config, _ = get_config()
+    cache_ttl = config.get('cache_ttl_seconds', 8)
+    entry = _site_cache.get(site_id)
+    if entry and time.monotonic() - entry[0] < cache_ttl:
+        return entry[1]
+
     api_base_url = config.get('api_base_url', 'https://transport.integration.sl.se/v1/sites')
     api_timeout = config.get('api_timeout', 10)
 
     url = f"{api_base_url}/{site_id}/departures"
-    headers = {"User-Agent": "SLTrafficMonitor/1.0"}
     past_window = 20
     future_window = 60
     start_time = (datetime.utcnow() - timedelta(minutes=past_window)).strftime('%Y-%m-%dT%H:%M:%SZ')
 
     try:
         response = fetch_with_retry(
-            url, headers,
+            url,
             params={'forecast': past_window + future_window, 'time': start_time},
             timeout=api_timeout
         )
-        data = response.json()
+        data = orjson.loads(response.content)
         raw_departures = data.get('departures', [])
         stop_deviations = data.get('stop_deviations', [])
 
@@ -206,9 +308,13 @@ def get_departures(site_id: int, filters: list) -> SiteResult:
             line_info = dep.get('line', {})
             line_num = line_info.get('designation') if isinstance(line_info, dict) else dep.get('line_designation')
             destination = dep.get('destination', 'Unknown')
-            live_by_line[str(line_num)].add(destination)
-            if matches_filter(line_num, destination, filters):
-                enriched = enrich_departure(dep, line_num, filters)
+            # Line designations are a small closed set; interning them lets the
+            # filter-index lookups compare by identity before falling back to ==
+            line_str = sys.intern(str(line_num))
+            dest_lower = (destination or '').lower()
+            live_by_line[line_str].add(destination)
+            if matches_filter(line_str, dest_lower, filters_index):
+                enriched = enrich_departure(dep, line_num, line_str, dest_lower)
                 if enriched:
                     filtered.append(enriched)
 
@@ -216,15 +322,21 @@ def get_departures(site_id: int, filters: list) -> SiteResult:
         # destination text usually means SL's live terminus/short-turn pattern has
         # drifted from what's in config.json — surface it instead of the route
         # silently disappearing from the board (see app.py matches_filter()).
-        for f in filters:
-            if f.line in live_by_line and not any(f.dest in (d or '').lower() for d in live_by_line[f.line]):
-                logger.warning(
-                    f"Site {site_id}: configured line {f.line} dest '{f.dest}' matched nothing; "
-                    f"live destinations for line {f.line}: {sorted(live_by_line[f.line])}"
-                )
-
-        filtered.sort(key=lambda x: x.get('expected') or x.get('scheduled'))
-        return SiteResult(site_name=site_name, departures=filtered, stop_deviations=stop_deviations)
+        for line, dests in filters_index.items():
+            if line not in live_by_line:
+                continue
+            live_lower = [(d or '').lower() for d in live_by_line[line]]
+            for dest in dests:
+                if not any(dest in d for d in live_lower):
+                    logger.warning(
+                        f"Site {site_id}: configured line {line} dest '{dest}' matched nothing; "
+                        f"live destinations for line {line}: {sorted(live_by_line[line])}"
+                    )
+
+        # Left unsorted: /api/data picks each group's earliest departures itself
+        result = SiteResult(site_name=site_name, departures=filtered, stop_deviations=stop_deviations)
+        _site_cache[site_id] = (time.monotonic(), result)
+        return result
 
     except Exception as e:
         logger.error(f"Error fetching departures for site {site_id}: {e}")
@@ -235,45 +347,24 @@ def get_departures(site_id: int, filters: list) -> SiteResult:
 def index():
     return render_template('index.html')
 
-def get_cached_data(ttl):
-    if _cache['data'] is None or _cache['timestamp'] is None:
-        return None
-    age = (datetime.now() - _cache['timestamp']).total_seconds()
-    if age < ttl:
-        return _cache['data']
-    return None
-
-def cache_data(data):
-    _cache['data'] = data
-    _cache['timestamp'] = datetime.now()
-
 @app.route('/api/data')
 def get_data():
     """Get departure data for all monitored routes."""
     config, grouped_config = get_config()
-    cache_ttl = config.get('cache_ttl_seconds', 8)
     group_order = config.get('group_order', ['TO WORK', 'FROM WORK'])
     max_departures = config.get('max_departures_per_station', 10)
 
-    cached = get_cached_data(cache_ttl)
-    if cached is not None:
-        return jsonify(cached)
-
-    site_data = {}
-    for group in grouped_config.values():
-        for site_id in group.keys():
-            if site_id not in site_data:
-                site_data[site_id] = {'site_name': None, 'groups': {}}
-
-    for site_id in site_data.keys():
-        all_filters = []
-        for group_name, sites in grouped_config.items():
-            if site_id in sites:
-                all_filters.extend(sites[site_id]['filters'])
-                site_data[site_id]['groups'][group_name] = sites[site_id]
-
+    # Fetch every unique site concurrently
+    site_filters = _config_cache['site_filters']
+    site_data = {site_id: {'site_name': None} for site_id in site_filters}
+    futures = {
+        EXECUTOR.submit(get_departures, site_id, filters_index): site_id
+        for site_id, filters_index in site_filters.items()
+    }
+    for future in as_completed(futures):
+        site_id = futures[future]
         try:
-            result = get_departures(site_id, all_filters)
+            result = future.result()
             site_data[site_id]['site_name'] = result.site_name
             site_data[site_id]['departures'] = result.departures
             site_data[site_id]['stop_deviations'] = result.stop_deviations
@@ -288,21 +379,26 @@ def get_data():
             continue
 
         group_stations = []
-        group_deviations = []
+        dev_map = {}  # message -> merged deviation, deduplicated as it's collected
         sites = grouped_config[group_name]
 
         for site_id, site_config in sites.items():
             site_info = site_data.get(site_id, {})
             departures = site_info.get('departures', [])
 
-            group_filters = site_config['filters']
+            group_filters = site_config['filters_by_line']
             filtered_deps = [
                 dep for dep in departures
-                if matches_filter(dep.get('line_num'), dep.get('destination', ''), group_filters)
+                if matches_filter(dep['_line_str'], dep['_dest_lower'], group_filters)
             ]
 
             if filtered_deps:
-                display_deps = filtered_deps[:max_departures]
+                # Shallow copies: the dicts are shared with _site_cache, and the
+                # GTFS enrichment below must not leak keys into later requests
+                display_deps = [
+                    dict(dep) for dep in
+                    heapq.nsmallest(max_departures, filtered_deps, key=itemgetter('_sort_key'))
+                ]
                 display_name = site_config['label'] or site_info.get('site_name') or f"Site {site_id}"
                 if trafiklab_client.is_enabled():
                     station_deviations = site_info.get('stop_deviations') or []
@@ -314,46 +410,37 @@ def get_data():
                     "departures": display_deps
                 })
 
-                if site_info.get('stop_deviations'):
-                    for dev in site_info['stop_deviations']:
-                        d = dev.copy()
-                        d['lines'] = set()
-                        d['station_wide'] = True
-                        group_deviations.append(d)
+                # Merged entries are only built on a message's first occurrence;
+                # setdefault() would evaluate the dict spread on every repeat
+                for dev in site_info.get('stop_deviations') or []:
+                    msg = dev.get('message')
+                    if msg and msg not in dev_map:
+                        dev_map[msg] = {**dev, 'lines': set(), 'station_wide': True}
 
                 for dep in filtered_deps:
-                    if dep.get('deviations'):
-                        line_num = dep.get('line_num')
-                        for dev in dep['deviations']:
-                            d = dev.copy()
-                            d['lines'] = {str(line_num)} if line_num else set()
-                            d['station_wide'] = False
-                            group_deviations.append(d)
+                    line_num = dep.get('line_num')
+                    for dev in dep.get('deviations') or []:
+                        msg = dev.get('message')
+                        if not msg:
+                            continue
+                        entry = dev_map.get(msg)
+                        if entry is None:
+                            entry = dev_map[msg] = {**dev, 'lines': set()}
+                        if line_num:
+                            entry['lines'].add(dep['_line_str'])
+                        entry['station_wide'] = False
 
         if group_stations:
-            dev_map = {}
-            for dev in group_deviations:
-                msg = dev.get('message')
-                if not msg:
-                    continue
-                if msg not in dev_map:
-                    dev_map[msg] = dev
-                else:
-                    dev_map[msg]['lines'].update(dev['lines'])
-                    if not dev.get('station_wide', True):
-                        dev_map[msg]['station_wide'] = False
-
             unique_deviations = []
             for dev in dev_map.values():
                 effect = dev.get('consequence', 'ALERT')
                 text = dev.get('message', '')
                 if dev['lines']:
-                    sorted_lines = sorted(list(dev['lines']), key=lambda x: (len(x), x))
+                    sorted_lines = sorted(dev['lines'], key=_line_sort_key)
                     dev['message'] = f"Line {', '.join(sorted_lines)}: [{effect}] {text}"
                 else:
                     dev['message'] = f"[{effect}] {text}"
                 dev.pop('lines', None)
-                dev.setdefault('station_wide', True)
                 unique_deviations.append(dev)
 
             results.append({
@@ -362,7 +449,6 @@ def get_data():
                 "deviations": unique_deviations
             })
 
-    cache_data(results)
     response = jsonify(results)
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     return response
@@ -395,9 +481,9 @@ def _fetch_site_name(site_id, api_base_url, api_timeout):
     """Fetch station name for a site by querying its departures endpoint."""
     try:
         url = f"{api_base_url}/{site_id}/departures"
-        response = requests.get(url, headers={"User-Agent": "SLTrafficMonitor/1.0"}, timeout=api_timeout)
+        response = SESSION.get(url, timeout=api_timeout)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         departures = data.get('departures', [])
         if departures:
             return site_id, departures[0].get('stop_area', {}).get('name')
@@ -415,13 +501,12 @@ def get_config_routes():
     api_base_url = config.get('api_base_url', 'https://transport.integration.sl.se/v1/sites')
     api_timeout = config.get('api_timeout', 10)
 
-    unique_ids = list({r['id'] for r in routes})
+    unique_ids = {r['id'] for r in routes}
     site_names = {}
-    with ThreadPoolExecutor(max_workers=min(len(unique_ids), 8)) as executor:
-        futures = {executor.submit(_fetch_site_name, sid, api_base_url, api_timeout): sid for sid in unique_ids}
-        for future in as_completed(futures):
-            sid, name = future.result()
-            site_names[sid] = name
+    futures = [EXECUTOR.submit(_fetch_site_name, sid, api_base_url, api_timeout) for sid in unique_ids]
+    for future in as_completed(futures):
+        sid, name = future.result()
+        site_names[sid] = name
 
     enriched = []
     for route in routes:
@@ -465,7 +550,7 @@ def save_config_routes():
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(full_config, f, indent=2, ensure_ascii=False)
         _config_cache['mtime'] = 0
-        _cache['data'] = None
+        _config_cache['last_check'] = float('-inf')
         return jsonify({'ok': True})
     except Exception as e:
         logger.error(f"Error saving config: {e}")
@@ -484,20 +569,20 @@ def search_stations():
     api_timeout = config.get('api_timeout', 10)
 
     try:
-        response = requests.get(
+        response = SESSION.get(
             api_base_url,
             params={'name': q, 'expand': 'true'},
-            headers={"User-Agent": "SLTrafficMonitor/1.0"},
             timeout=api_timeout
         )
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         sites = data.get('sites', []) if isinstance(data, dict) else data
 
+        needle = q.casefold()
         results = [
             {'id': s['id'], 'name': s['name']}
             for s in sites
-            if q.lower() in (s.get('name') or '').lower() and s.get('id') and s.get('name')
+            if needle in (s.get('name') or '').casefold() and s.get('id') and s.get('name')
         ]
         return jsonify({'stations': results[:20]})
     except Exception as e:
@@ -514,9 +599,9 @@ def get_station_routes(site_id):
 
     try:
         url = f"{api_base_url}/{site_id}/departures"
-        response = requests.get(url, headers={"User-Agent": "SLTrafficMonitor/1.0"}, timeout=api_timeout)
+        response = SESSION.get(url, timeout=api_timeout)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         departures = data.get('departures', [])
 
         site_name = None
@@ -1,7 +1,16 @@
 import json
 import os
 import sys
+import orjson
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+# Every site lives on the same SL host, so one keep-alive session saves a
+# TCP + TLS handshake on every request after the first.
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "SLTrafficMonitor/LineChecker", "Accept-Encoding": "gzip, deflate"})
+SESSION.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16))
 
 def load_config():
     """Load configuration from config.json."""
@@ -14,6 +23,24 @@ def load_config():
         print(f"Error loading config.json: {e}")
         sys.exit(1)
 
+def scan_site(site_id, api_base_url, timeout):
+    """Fetch a site's departures and return every deviation attached to it.
+
+    The whole payload is parsed in memory, so up to one payload per pool
+    worker can be alive at once; sites are small enough that this is fine.
+    """
+    url = f"{api_base_url}/{site_id}/departures"
+    # Fetch departures with a forecast window
+    response = SESSION.get(url, params={'forecast': 60}, timeout=timeout)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+
+    # Stop deviations, then departure deviations
+    deviations = list(data.get('stop_deviations', []))
+    for dep in data.get('departures', []):
+        deviations.extend(dep.get('deviations', []))
+    return deviations
+
 def main():
     config = load_config()
     api_base_url = config.get('api_base_url', 'https://transport.integration.sl.se/v1/sites')
@@ -31,42 +58,30 @@ def main():
 
     print(f"\nScanning {len(site_ids)} monitored sites for all active alerts...")
     
-    headers = {"User-Agent": "SLTrafficMonitor/LineChecker"}
-    found_deviations = []
+    found_deviations = {}  # message -> deviation, same dedup key as app.py's /api/data
 
-    for site_id in site_ids:
-        url = f"{api_base_url}/{site_id}/departures"
-        try:
-            # Fetch departures with a forecast window
-            response = requests.get(url, headers=headers, params={'forecast': 60}, timeout=timeout)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Check stop deviations
-            stop_deviations = data.get('stop_deviations', [])
-            for dev in stop_deviations:
-                if dev not in found_deviations:
-                    found_deviations.append(dev)
+    # Scan sites concurrently so one site's decode overlaps the others' network waits
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {executor.submit(scan_site, site_id, api_base_url, timeout): site_id for site_id in site_ids}
+        for future in as_completed(futures):
+            site_id = futures[future]
+            try:
+                deviations = future.result()
+            except Exception:
+                # Skip errors (e.g. timeouts) to keep scanning other sites
+                continue
 
-            # Check departure deviations
-            departures = data.get('departures', [])
-            
-            for dep in departures:
-                deviations = dep.get('deviations', [])
-                for dev in deviations:
-                    if dev not in found_deviations:
-                        found_deviations.append(dev)
-            
-            print(f"  Site {site_id}: Scanned")
+            for dev in deviations:
+                msg = dev.get('message')
+                if msg and msg not in found_deviations:
+                    found_deviations[msg] = dev
 
-        except Exception:
-            # Skip errors (e.g. timeouts) to keep scanning other sites
-            continue
+            print(f"  Site {site_id}: Scanned")
 
     print(f"\nFound {len(found_deviations)} unique alerts:\n")
     
     if found_deviations:
-        print(json.dumps(found_deviations, indent=2, ensure_ascii=False))
+        print(json.dumps(list(found_deviations.values()), indent=2, ensure_ascii=False))
     else:
         print("No alerts found.")
 
@@ -1,15 +1,34 @@
+import atexit
+import itertools
 import json
 import os
+import queue
 import sys
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+# orjson parses the departures payloads several times faster; both modules'
+# loads() accept bytes, so the stdlib is a drop-in fallback
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+import api_cache
+
+@lru_cache(maxsize=4)
+def _read_config(config_path, mtime_ns):
+    """Parse config.json; memoized per (path, mtime) so an unchanged file is only parsed once."""
+    with open(config_path, 'rb') as f:
+        return _json.loads(f.read())
 
 def load_config():
     """Load configuration from config.json in the same directory."""
     base_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(base_dir, 'config.json')
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _read_config(config_path, os.stat(config_path).st_mtime_ns)
     except FileNotFoundError:
         print(f"Error: config.json not found at {config_path}")
         sys.exit(1)
@@ -17,104 +36,253 @@ def load_config():
         print(f"Error: Invalid JSON in config.json: {e}")
         sys.exit(1)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(BASE_DIR, '.find_station_history')
+
+# Station names seen in search results this session, offered as tab completions
+_STATION_NAMES = set()
+
 CONFIG = load_config()
 API_BASE_URL = CONFIG.get('api_base_url', 'https://transport.integration.sl.se/v1/sites')
 API_TIMEOUT = CONFIG.get('api_timeout', 10)
+CACHE_TTL_DEPARTURES = CONFIG.get('cache_ttl_departures', 30)
+CACHE_TTL_STATION_SEARCH = CONFIG.get('cache_ttl_station_search', 86400)
+MAX_SEARCH_RESULTS = 50
 
-def search_station(search_term):
-    """Search for stations by name."""
-    print(f"Searching for '{search_term}'...")
-    headers = {"User-Agent": "SLTrafficMonitor/1.0"}
-    
-    try:
+# Bodies are parsed straight from response.content, so ask for them compressed
+# and never pay for requests' charset detection / str decoding.
+_HEADERS = {"User-Agent": "SLTrafficMonitor/1.0", "Accept-Encoding": "gzip, deflate"}
+
+# requests (with urllib3 and charset_normalizer) takes tens of ms to import, so it
+# is deferred until the first API call rather than paid before the menu appears;
+# the functions below import it locally for its exception types.
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the shared keep-alive session, creating it on first use.
+
+    One session for every lookup, so repeat requests to the SL host skip the
+    TCP + TLS handshake; transient 429/5xx responses are retried with backoff.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            session.headers.update(_HEADERS)
+            session.mount('https://', HTTPAdapter(
+                pool_maxsize=32,
+                max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504]),
+            ))
+            _session = session
+    return _session
+
+def fetch_sites(search_term):
+    """Search the SL sites endpoint by name, served from the disk cache when fresh.
+
+    Returns [id, name] pairs for the sites whose names contain search_term,
+    at most MAX_SEARCH_RESULTS + 1 of them so callers can tell the result
+    was cut off. Only these are cached: the expanded sites response can be
+    close to the whole site list, and caching it once per search term bloats
+    the cache file that every api_cache.put() rewrites.
+    """
+    key = f"site_matches:{search_term}"
+    matches = api_cache.get(key, CACHE_TTL_STATION_SEARCH)
+    if matches is None:
         # Try searching using 'name' parameter
-        response = requests.get(
+        response = get_session().get(
             API_BASE_URL, 
             params={'name': search_term, 'expand': 'true'}, 
-            headers=headers, 
             timeout=API_TIMEOUT
         )
         response.raise_for_status()
-        data = response.json()
-        
+        data = _json.loads(response.content)
         # Handle different response structures (list or dict with 'sites' key)
         sites = data.get('sites', []) if isinstance(data, dict) else data
-        
-        if not sites:
-            print("No stations found.")
-            return
+        # Filter locally just in case the API didn't filter strictly, stopping
+        # one past the display cap (short queries can match hundreds of sites)
+        needle = search_term.casefold()
+        matching = (
+            [site.get('id'), site.get('name')] for site in sites
+            if site.get('id') and needle in (site.get('name') or '').casefold()
+        )
+        matches = list(itertools.islice(matching, MAX_SEARCH_RESULTS + 1))
+        api_cache.put(key, matches, CACHE_TTL_STATION_SEARCH)
+    return matches
 
-        # Filter locally just in case the API didn't filter strictly
-        filtered_sites = [
-            s for s in sites 
-            if search_term.lower() in (s.get('name') or '').lower()
-        ]
-        
-        if not filtered_sites:
-            print("No matching stations found after filtering.")
-            return
+def fetch_departures(site_id):
+    """Fetch a site's departure records, served from the disk cache when fresh."""
+    key = api_cache.departures_key(site_id)
+    records = api_cache.get(key, CACHE_TTL_DEPARTURES)
+    if records is None:
+        url = f"{API_BASE_URL}/{site_id}/departures"
+        response = get_session().get(url, params={'forecast': api_cache.DEPARTURES_FORECAST}, timeout=API_TIMEOUT)
+        response.raise_for_status()
+        records = api_cache.departure_records(_json.loads(response.content))
+        api_cache.put(key, records, CACHE_TTL_DEPARTURES)
+    return records
+
+def print_matching_sites(matches):
+    """Print the [id, name] pairs returned by fetch_sites."""
+    if not matches:
+        print("No stations found.")
+        return
 
+    filtered_sites = matches[:MAX_SEARCH_RESULTS]
+    if len(matches) > MAX_SEARCH_RESULTS:
+        print(f"\nShowing the first {MAX_SEARCH_RESULTS} matching stations (refine the search to narrow it down):")
+    else:
         print(f"\nFound {len(filtered_sites)} stations:")
-        print(f"{'ID':<10} | {'Name'}")
-        print("-" * 40)
-        
-        for site in filtered_sites:
-            site_id = site.get('id')
-            site_name = site.get('name')
-            if site_id and site_name:
-                print(f"{site_id:<10} | {site_name}")
-                
-    except requests.exceptions.RequestException as e:
+    print(f"{'ID':<10} | {'Name'}")
+    print("-" * 40)
+    
+    for site_id, site_name in filtered_sites:
+        if site_name:
+            print(f"{site_id:<10} | {site_name}")
+            _STATION_NAMES.add(site_name)
+
+def search_station(search_term):
+    """Search for stations by name."""
+    import requests
+    print(f"Searching for '{search_term}'...")
+    
+    try:
+        matches = fetch_sites(search_term)
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"API request failed: {e}")
+        return
+    print_matching_sites(matches)
+
+def search_stations_batch(terms):
+    """Search several station names concurrently over the shared session.
+
+    Yields (term, matches, error) as each lookup finishes, so N lookups take
+    about one round-trip instead of N; error is None on success.
+    """
+    import requests
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {executor.submit(fetch_sites, term): term for term in terms}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except (requests.exceptions.RequestException, ValueError) as e:
+                yield futures[future], None, e
+
+def batch_search(terms):
+    """Run search_stations_batch and print each term's matches."""
+    print(f"Searching for {len(terms)} stations...")
+    for term, matches, error in search_stations_batch(terms):
+        print(f"\n=== {term} ===")
+        if error is not None:
+            print(f"API request failed: {error}")
+        else:
+            print_matching_sites(matches)
 
 def get_lines_and_destinations(site_id):
     """Fetch departures and list unique lines and destinations."""
+    import requests
     print(f"Fetching departures for Site ID {site_id}...")
-    url = f"{API_BASE_URL}/{site_id}/departures"
-    headers = {"User-Agent": "SLTrafficMonitor/1.0"}
     
     try:
-        response = requests.get(url, headers=headers, timeout=API_TIMEOUT)
-        response.raise_for_status()
-        data = response.json()
-        departures = data.get('departures', [])
+        departures = fetch_departures(site_id)
         
         if not departures:
             print("No departures found.")
             return
 
-        site_name = departures[0].get('stop_area', {}).get('name', 'Unknown Station')
+        site_name = departures[0][2] or 'Unknown Station'
         
         # Extract unique lines and destinations
-        routes = set()
-        for dep in departures:
-            line_info = dep.get('line', {})
-            line_num = line_info.get('designation') if isinstance(line_info, dict) else dep.get('line_designation')
-            dest = dep.get('destination')
-            
-            if line_num and dest:
-                routes.add((str(line_num), dest))
+        routes = {(line_num, dest) for line_num, dest, _ in departures if line_num and dest}
         
         print(f"\nDepartures from {site_name} (ID: {site_id}):")
         print(f"{'Line':<8} | {'Destination'}")
         print("-" * 40)
         
         # Sort by line number then destination
-        for line, dest in sorted(list(routes)):
+        for line, dest in sorted(routes):
             print(f"{line:<8} | {dest}")
             
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"API request failed: {e}")
 
+def _complete_station(text, state):
+    """readline completer over station names from earlier searches."""
+    prefix = text.casefold()
+    matches = sorted(n for n in _STATION_NAMES if n.casefold().startswith(prefix))
+    return matches[state] if state < len(matches) else None
+
+def _setup_readline():
+    """Enable persistent input history and station-name tab completion, where readline exists."""
+    try:
+        import readline
+    except ImportError:  # e.g. Windows without pyreadline
+        return
+    try:
+        readline.read_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+    readline.set_history_length(500)
+    atexit.register(readline.write_history_file, HISTORY_FILE)
+    # Station names contain spaces, so complete against the whole input line
+    readline.set_completer_delims('\t\n')
+    readline.set_completer(_complete_station)
+    readline.parse_and_bind('tab: complete')
+
+PREFETCH_WORKERS = 4
+
+def _prefetch_departures(site_ids):
+    """Warm the disk cache for sites taken off a shared queue until it's empty.
+
+    Failures just leave that site cold.
+    """
+    while True:
+        try:
+            site_id = site_ids.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            fetch_departures(site_id)
+        except Exception:
+            pass
+
+_prefetch_started = False
+
+def _start_prefetch():
+    """Warm the departures cache for every configured site, once per session.
+
+    Started the first time option 2 is picked rather than at launch, so a
+    session that never lists departures never imports requests for it or
+    spends API calls on it; the fetches overlap typing in the station ID.
+    A few daemon threads drain the sites rather than an executor:
+    concurrent.futures joins its workers at exit, so quitting straight away
+    would wait on every fetch.
+    """
+    global _prefetch_started
+    if _prefetch_started:
+        return
+    _prefetch_started = True
+    site_ids = queue.SimpleQueue()
+    for site_id in {r['id'] for r in CONFIG.get('monitored_routes', [])}:
+        site_ids.put(site_id)
+    for _ in range(min(PREFETCH_WORKERS, site_ids.qsize())):
+        threading.Thread(target=_prefetch_departures, args=(site_ids,), daemon=True).start()
+
 def main():
     print("SL Transport API Explorer")
     print("=========================")
+    _setup_readline()
     
     try:
         while True:
             print("\nOptions:")
             print("1. Search for Station ID by Name")
             print("2. List Lines and Destinations by Station ID")
+            print("3. Batch search for Station IDs by Name")
             print("q. Quit")
             
             choice = input("\nEnter choice: ").strip().lower()
@@ -124,11 +292,23 @@ def main():
                 if name:
                     search_station(name)
             elif choice == '2':
+                _start_prefetch()
                 site_id = input("Enter Station ID: ").strip()
                 if site_id.isdigit():
                     get_lines_and_destinations(int(site_id))
                 else:
                     print("Invalid ID. Please enter a number.")
+            elif choice == '3':
+                print("Enter station names, one per line (blank line to finish):")
+                terms = []
+                while True:
+                    name = input("> ").strip()
+                    if not name:
+                        break
+                    if name not in terms:
+                        terms.append(name)
+                if terms:
+                    batch_search(terms)
             elif choice == 'q':
                 break
             else:
@@ -1,14 +1,25 @@
 import time
 import requests
+from requests.adapters import HTTPAdapter
 
+# One pooled, keep-alive session for the whole process: every SL call goes to the
+# same host, so reusing the connection skips a TCP + TLS handshake per request.
+# pool_maxsize must stay >= app.FETCH_WORKERS or the pool discards connections.
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": "SLTrafficMonitor/1.0",
+    "Accept-Encoding": "gzip, deflate",
+})
+SESSION.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16))
 
-def fetch_with_retry(url: str, headers: dict, params: dict = None,
+
+def fetch_with_retry(url: str, headers: dict = None, params: dict = None,
                       timeout: int = 10, max_retries: int = 1) -> requests.Response:
     """GET with exponential backoff on transient failures (1 retry, 1 s delay)."""
     last_exc = None
     for attempt in range(max_retries + 1):
         try:
-            resp = requests.get(url, headers=headers, params=params, timeout=timeout)
+            resp = SESSION.get(url, headers=headers, params=params, timeout=timeout)
             resp.raise_for_status()
             return resp
         except requests.exceptions.RequestException as exc:
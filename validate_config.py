@@ -1,8 +1,19 @@
-import json
+import io
 import os
 import sys
+from functools import lru_cache, partial
+
+# Prefer orjson for parsing; stdlib json.loads takes bytes too if it's missing
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
 import requests
-import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import api_cache
 
 # ANSI colors for console output
 GREEN = '\033[92m'
@@ -10,17 +21,123 @@ RED = '\033[91m'
 YELLOW = '\033[93m'
 RESET = '\033[0m'
 
+# Sites are checked against the same host, so keep the connection alive between
+# them and let urllib3 retry rate-limit/gateway errors instead of failing the site.
+# Requests go out back to back; only a 429/5xx triggers a wait, with exponential
+# backoff that defers to the API's Retry-After header when it sends one.
+_HEADERS = {"User-Agent": "SLTrafficMonitor/1.0", "Accept-Encoding": "gzip, deflate"}
+
+SESSION = requests.Session()
+SESSION.headers.update(_HEADERS)
+SESSION.mount('https://', HTTPAdapter(
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        respect_retry_after_header=True,
+    ),
+))
+
+@lru_cache(maxsize=4)
+def _read_config(config_path, mtime_ns):
+    """Parse config.json, cached until its mtime changes."""
+    with open(config_path, 'rb') as f:
+        return _json.loads(f.read())
+
 def load_config():
     """Load configuration from config.json."""
     base_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(base_dir, 'config.json')
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _read_config(config_path, os.stat(config_path).st_mtime_ns)
     except Exception as e:
         print(f"{RED}Error loading config.json: {e}{RESET}")
         sys.exit(1)
 
+def fetch_site(site_id, api_base_url, timeout, cache_ttl):
+    """Fetch a site's departure records, raising on HTTP errors.
+
+    Served from the on-disk cache when a fresh entry exists (see api_cache.py).
+    """
+    key = api_cache.departures_key(site_id)
+    records = api_cache.get(key, cache_ttl)
+    if records is None:
+        url = f"{api_base_url}/{site_id}/departures"
+        # Add forecast param to match interactive behavior
+        response = SESSION.get(url, params={'forecast': api_cache.DEPARTURES_FORECAST}, timeout=timeout)
+        response.raise_for_status()
+        records = api_cache.departure_records(_json.loads(response.content))
+        api_cache.put(key, records, cache_ttl)
+    return records
+
+def check_site(site_id, routes, departures_future):
+    """Validate one site's configured routes against its fetched departures.
+
+    Returns (report, ok_count, fail_count); the report is buffered so the caller
+    writes each site's output in a single call.
+    """
+    buf = io.StringIO()
+    out = partial(print, file=buf)
+    total_ok = 0
+    total_fail = 0
+
+    out(f"Checking Site ID {site_id} ({len(routes)} routes)...")
+    
+    try:
+        departures = departures_future.result()
+        
+        site_name = "Unknown Station"
+        if departures:
+            site_name = departures[0][2] or 'Unknown Station'
+
+        if not departures:
+            out(f"  {YELLOW}Warning: No departures returned for site {site_id}. Cannot validate routes.{RESET}")
+            for route in routes:
+                out(f"  ? {route['group']} | Line {route['line']} to {route['dest']} - {YELLOW}NO DATA{RESET}")
+            return buf.getvalue(), total_ok, total_fail
+
+        out(f"  Station: {site_name}")
+
+        # Index departures by line once, rather than rescanning them for every route
+        line_to_dests = {}
+        for line_num, dest, _ in departures:
+            line_to_dests.setdefault(str(line_num), []).append(dest or '')
+        lower_dests = {ln: [(d or '').lower() for d in dests] for ln, dests in line_to_dests.items()}
+
+        for route in routes:
+            target_line = str(route['line'])
+            target_dest = route['dest'].lower()
+            
+            dests = lower_dests.get(target_line)
+            if dests is None:
+                # Line isn't running here at all, no destinations to check
+                out(f"  {RED}FAIL{RESET} {route['group']} | Line {target_line} to {route['dest']}")
+                out(f"       {YELLOW}Line {target_line} not found in current departures.{RESET}")
+                # Show available lines to help
+                available_lines = sorted(line_to_dests)
+                out(f"       Available lines: {', '.join(available_lines)}")
+                total_fail += 1
+                continue
+
+            # Logic matches app.py: configured dest must be IN the api dest
+            if any(target_dest in d for d in dests):
+                out(f"  {GREEN}OK{RESET}   {route['group']} | Line {target_line} to {route['dest']}")
+                total_ok += 1
+            else:
+                out(f"  {RED}FAIL{RESET} {route['group']} | Line {target_line} to {route['dest']}")
+                unique_dests = sorted(set(line_to_dests[target_line]))
+                out(f"       {YELLOW}Found Line {target_line} but destinations were: {', '.join(unique_dests)}{RESET}")
+                out(f"       {YELLOW}Configured '{route['dest']}' must be inside one of those.{RESET}")
+                total_fail += 1
+
+    except Exception as e:
+        out(f"  {RED}API Error for site {site_id}: {e}{RESET}")
+        total_fail += len(routes)
+    
+    out("") # Newline between sites
+    return buf.getvalue(), total_ok, total_fail
+
 def main():
     # Enable ANSI colors in Windows terminal
     os.system('color')
@@ -28,6 +145,7 @@ def main():
     config = load_config()
     api_base_url = config.get('api_base_url', 'https://transport.integration.sl.se/v1/sites')
     timeout = config.get('api_timeout', 10)
+    cache_ttl = config.get('cache_ttl_departures', 30)
     monitored_routes = config.get('monitored_routes', [])
 
     print(f"Validating {len(monitored_routes)} routes from config.json...\n")
@@ -40,82 +158,25 @@ def main():
             sites_to_check[site_id] = []
         sites_to_check[site_id].append(route)
 
-    headers = {"User-Agent": "SLTrafficMonitor/1.0"}
-    
     total_ok = 0
     total_fail = 0
 
-    for site_id, routes in sites_to_check.items():
-        print(f"Checking Site ID {site_id} ({len(routes)} routes)...")
-        url = f"{api_base_url}/{site_id}/departures"
-        
-        try:
-            # Add forecast param and delay to match interactive behavior and avoid rate limits
-            response = requests.get(url, headers=headers, params={'forecast': 60}, timeout=timeout)
-            response.raise_for_status()
-            data = response.json()
-            departures = data.get('departures', [])
-            
-            site_name = "Unknown Station"
-            if departures:
-                site_name = departures[0].get('stop_area', {}).get('name', 'Unknown Station')
-
-            if not departures:
-                print(f"  {YELLOW}Warning: No departures returned for site {site_id}. Cannot validate routes.{RESET}")
-                print(f"  DEBUG: Status: {response.status_code}")
-                print(f"  DEBUG: Response: {response.text[:100]}...")
-                for route in routes:
-                    print(f"  ? {route['group']} | Line {route['line']} to {route['dest']} - {YELLOW}NO DATA{RESET}")
-                continue
+    # Fetch every site up front on a small pool (bounded to stay polite to the API),
+    # then report in config order as each result becomes available
+    executor = ThreadPoolExecutor(max_workers=8)
+    futures = {
+        site_id: executor.submit(fetch_site, site_id, api_base_url, timeout, cache_ttl)
+        for site_id in sites_to_check
+    }
 
-            print(f"  Station: {site_name}")
+    for site_id, routes in sites_to_check.items():
+        report, ok, fail = check_site(site_id, routes, futures.pop(site_id))
+        sys.stdout.write(report)
+        sys.stdout.flush()
+        total_ok += ok
+        total_fail += fail
 
-            for route in routes:
-                target_line = str(route['line'])
-                target_dest = route['dest'].lower()
-                
-                found = False
-                matched_destinations = []
-                
-                # Check against all departures
-                for dep in departures:
-                    line_info = dep.get('line', {})
-                    line_num = str(line_info.get('designation') if isinstance(line_info, dict) else dep.get('line_designation'))
-                    dest = dep.get('destination', '')
-                    
-                    if line_num == target_line:
-                        matched_destinations.append(dest)
-                        # Logic matches app.py: configured dest must be IN the api dest
-                        if target_dest in dest.lower():
-                            found = True
-                            break
-                
-                if found:
-                    print(f"  {GREEN}OK{RESET}   {route['group']} | Line {target_line} to {route['dest']}")
-                    total_ok += 1
-                else:
-                    print(f"  {RED}FAIL{RESET} {route['group']} | Line {target_line} to {route['dest']}")
-                    if matched_destinations:
-                        unique_dests = sorted(list(set(matched_destinations)))
-                        print(f"       {YELLOW}Found Line {target_line} but destinations were: {', '.join(unique_dests)}{RESET}")
-                        print(f"       {YELLOW}Configured '{route['dest']}' must be inside one of those.{RESET}")
-                    else:
-                        print(f"       {YELLOW}Line {target_line} not found in current departures.{RESET}")
-                        # Show available lines to help
-                        available_lines = sorted(list(set([
-                            str(d.get('line', {}).get('designation') or d.get('line_designation')) 
-                            for d in departures
-                        ])))
-                        print(f"       Available lines: {', '.join(available_lines)}")
-                    total_fail += 1
-
-        except Exception as e:
-            print(f"  {RED}API Error for site {site_id}: {e}{RESET}")
-            total_fail += len(routes)
-        
-        # Small delay to avoid hitting API rate limits
-        time.sleep(0.5)
-        print("") # Newline between sites
+    executor.shutdown()
 
     print("-" * 40)
     print(f"Summary: {GREEN}{total_ok} OK{RESET}, {RED}{total_fail} Failed/Warning{RESET}")